@@ -1,9 +1,14 @@
-from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from itertools import product
+from operator import attrgetter
 
 import argparse
 import exiftool
-import re
+import os
+import queue
+import sys
+import threading
 
 # assume folder structure:
 # 20211226/  <- date
@@ -17,37 +22,76 @@ import re
 #     ...
 
 
+def all_cases(*extensions):
+    """
+    Returns a tuple of every mix of upper and lower case of the given file
+    extensions, each with a leading ".", so that str.endswith can check a
+    filename against all of them in one call, without lowercasing it.
+    """
+    return tuple(
+        "." + "".join(chars)
+        for extension in extensions
+        for chars in product(*((char, char.upper()) for char in extension)))
+
+
+def positive_int(value):
+    """
+    Converts a command line argument to an int, for arguments that have to be
+    at least 1, such as how many threads to use.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return number
+
+
 class NoritsuEZCCleaner:
     EXIF_DATETIME_STR_FORMAT = "%Y:%m:%d %H:%M:%S"
     EXIFTOOL_SUCCESSFUL_WRITE_MESSAGE = "1 image files updated"
-    IMAGE_DIR_GLOB_PATTERN = "[0-9]" * 8
-    IMAGE_NAME_PATTERN = \
-        r"(?P<roll_number>\d{8})" \
-        r"(?P<frame_number>\d{4})" \
-        r"(_(?P<frame_name>.*))?"
-    image_name_matcher = re.compile(IMAGE_NAME_PATTERN)
+    # pyexiftool only reads exiftool's output (and stderr only after stdout)
+    # after sending the whole batch, so keep each call to exiftool small
+    # enough for its input and output to fit in the pipe buffers
+    EXIFTOOL_BATCH_SIZE = 128
+    IMAGE_SUFFIXES = all_cases("jpg", "tif")
+    THUMBNAIL_SUFFIXES = all_cases("thm")
+
+    __slots__ = ("exiftool", "search_path", "roll_padding", "use_frame_names",
+                 "jobs", "rename_workers", "verbose")
 
     def __init__(self,
                  exiftool_client,
                  search_path=None,
                  roll_padding=4,
-                 use_frame_names=False):
+                 use_frame_names=False,
+                 jobs=None,
+                 rename_workers=1,
+                 verbose=True):
         """
         exiftool_client is a exiftool.ExifToolHelper object that will be used
         to perform all EXIF modifications required.
-        search_path is a str representing the path to search for images to fix.
-        If not provided, search_path will be the current working directory.
+        search_path is a path-like object representing the path to search for
+        images to fix. If not provided, search_path will be the current working
+        directory.
         roll_padding is how many characters of zero padding to add for the
         roll number
         use_frame_names is whether to use the DX reader frame numbers/names
         in the final filename or just number them sequentially.
+        jobs is how many image directories to process at the same time. If not
+        provided, jobs will be the number of CPUs (or 1 if that isn't known).
+        rename_workers is how many image directories to rename the images of at
+        the same time. Renames within a directory always happen in order.
+        verbose is whether to print every file that gets deleted, timestamped
+        or renamed. Warnings and errors are always printed.
         """
         self.exiftool = exiftool_client
 
+        # paths are kept as plain strs throughout, there's no need for Path
+        # objects for all the directories and images. The path is normalized
+        # like Path would, so e.g. a trailing slash doesn't hide its basename.
         if not search_path:
-            self.search_path = Path.cwd()
+            self.search_path = os.getcwd()
         else:
-            self.search_path = Path(search_path)
+            self.search_path = os.path.normpath(os.fspath(search_path))
 
         self.roll_padding = roll_padding
         self.use_frame_names = use_frame_names
@@ -56,16 +100,89 @@ class NoritsuEZCCleaner:
                   "multiple files having the same frame name such as "
                   "### or for cases of film with no rebate")
 
+        self.jobs = jobs or os.cpu_count() or 1
+        self.rename_workers = rename_workers
+        self.verbose = verbose
+
     def clean(self):
-        for image_dir in self.find_all_image_dirs():
+        # each image dir is independent, and scanning them is mostly waiting on
+        # the filesystem, so scan several of them at once. Each batch of images
+        # is also renamed in the background, while the next batch is written.
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor, \
+                ThreadPoolExecutor(
+                    max_workers=self.rename_workers) as rename_executor:
+            renames = []
+            batch = []
+            batch_size = 0
+            for dir_images in self.scan_all_image_dirs(executor):
+                if not dir_images:
+                    continue
+                # images from all the dirs are written with as few exiftool
+                # calls as possible, instead of one call per dir
+                batch.append(dir_images)
+                batch_size += len(dir_images)
+                if batch_size >= self.EXIFTOOL_BATCH_SIZE:
+                    renames += self.write_and_rename(batch, rename_executor)
+                    batch = []
+                    batch_size = 0
+            if batch:
+                renames += self.write_and_rename(batch, rename_executor)
+
+            # re-raise any error from renaming
+            for future in renames:
+                future.result()
+
+    def scan_all_image_dirs(self, executor):
+        """
+        Yields the images returned by clean_dir for every image dir, in the
+        order find_all_image_dirs finds them.
+
+        The search for image dirs runs on its own thread, which submits each
+        image dir to executor to be scanned as soon as it's found. That way the
+        first image dirs can be written to and renamed while the rest of the
+        search path is still being searched. The search thread stops getting
+        ahead once there are a couple of scans per worker waiting.
+
+        executor is the concurrent.futures.Executor to scan the image dirs on.
+        """
+        scans = queue.Queue(maxsize=self.jobs * 2)
+
+        def find_and_scan():
             try:
-                self.delete_thm_files(image_dir)
-                self.delete_infohd_file(image_dir)
-                self.fix_timestamps(image_dir)
-                self.rename_images(image_dir)
-            except ValueError as e:
-                print(e)
-                print(f"skipping directory {image_dir}...")
+                for image_dir in self.find_all_image_dirs():
+                    scans.put(executor.submit(self.clean_dir, image_dir))
+            except Exception as err:
+                # hand the error over to be raised by the consuming thread
+                failed = Future()
+                failed.set_exception(err)
+                scans.put(failed)
+            finally:
+                # tells the consuming thread that there are no more dirs
+                scans.put(None)
+
+        threading.Thread(target=find_and_scan, daemon=True).start()
+        while True:
+            scan = scans.get()
+            if scan is None:
+                return
+            yield scan.result()
+
+    def clean_dir(self, image_dir):
+        """
+        Deletes the leftover EZC files in image_dir, and returns its images
+        to be passed to write_and_rename. If the images aren't named as
+        expected, or the directory can't be read, the directory is skipped and
+        no images are returned.
+
+        image_dir is a str of the path of the directory of images to operate
+        on.
+        """
+        try:
+            return self._process_dir(image_dir)
+        except (ValueError, OSError) as e:
+            self.write_output([f"{e}\n",
+                               f"skipping directory {image_dir}...\n"])
+            return []
 
     def find_all_image_dirs(self):
         """
@@ -75,102 +192,144 @@ class NoritsuEZCCleaner:
 
         Unfortunately, the parent directory (which is the date) is also 8
         digits...
-        """
-        found_dirs = []
-        # if the search_path itself is a image dir, add it to beginning of
-        # results
-        if self.search_path.is_dir() and \
-                re.match(self.IMAGE_DIR_GLOB_PATTERN, self.search_path.name):
-            found_dirs.append(self.search_path)
-        found_dirs += sorted(
-            self.search_path.glob("**/" + self.IMAGE_DIR_GLOB_PATTERN))
-
-        return found_dirs
-
-    def delete_infohd_file(self, images_dir):
-        """
-        Deletes the Info_HD.txt file that EZC generates if you ask it to always
-        save to HDD without confirming.
 
-        images_dir is a path object that represents the directory of images to
-        operate on.
+        The dirs are yielded in sorted order as they're found, starting with
+        the search_path itself if it's an image dir.
         """
-        infohd_path = images_dir.joinpath("Info_HD.txt")
-        if infohd_path.exists() and infohd_path.is_file():
-            print(f"deleting {infohd_path}")
-            infohd_path.unlink()
+        if os.path.isdir(self.search_path):
+            yield from self._iter_image_dirs(self.search_path)
 
-    def delete_thm_files(self, images_dir):
+    def _iter_image_dirs(self, root):
         """
-        Deletes the *.thm thumbnail files that EZC generates when outputting
-        TIFFs.
-
-        images_dir is a path object that represents the directory of images to
-        operate on.
+        Yields root and every directory under root whose name is 8 digits, in
+        sorted order.
+
+        This walks the tree with os.scandir directly instead of Path.glob, so
+        the is_dir check comes from the cached DirEntry, and paths stay as
+        strs. A stack of directories left to visit is used instead of
+        recursion, with each directory's subdirectories pushed in reverse
+        sorted order, so matches can be yielded as soon as they're found while
+        still coming out sorted.
+
+        An 8 digit directory inside another 8 digit directory is an order
+        directory inside a date directory, so it only holds images and isn't
+        scanned for more image directories. This saves listing every order
+        directory an extra time. Other 8 digit directories (which may be
+        dates) are still searched.
+
+        Symlinks aren't followed, but the same directory can still show up
+        twice through a bind mount, which would have its images renamed twice.
+        So each 8 digit directory is only visited once, going by its device
+        and inode number. That comes from the DirEntry's stat, which is cached
+        and only needed for the few directories whose names match. On Windows
+        the DirEntry's stat always has an st_ino and st_dev of 0, so there the
+        directory has to be stat'ed again to get them.
+
+        root is a str of the path of the directory to search under.
         """
-        for thm_file in images_dir.glob("*.thm"):
-            if thm_file.exists() and thm_file.is_file():
-                print(f"deleting {thm_file}")
-                thm_file.unlink()
+        def is_image_dir_name(name):
+            # isdecimal() accepts the same digits as \d does
+            return len(name) == 8 and name.isdecimal()
+
+        seen = set()
+        # each item is a dir left to visit, its DirEntry (None for root),
+        # whether that dir's name is 8 digits, and whether its parent's name is
+        # 8 digits
+        stack = [
+            (root, None, is_image_dir_name(os.path.basename(root)), False)]
+        while stack:
+            dir_path, dir_entry, is_image_dir, in_image_dir = stack.pop()
+            if is_image_dir:
+                if dir_entry is None:
+                    st = os.stat(dir_path)
+                else:
+                    st = dir_entry.stat(follow_symlinks=False)
+                    if not st.st_ino:
+                        st = os.stat(dir_path, follow_symlinks=False)
+                dir_id = (st.st_dev, st.st_ino)
+                if dir_id in seen:
+                    continue
+                seen.add(dir_id)
+
+                yield dir_path
+                if in_image_dir:
+                    continue
+
+            # like Path.glob, skip over directories that can't be read (such
+            # as a NAS's #recycle) instead of stopping the whole search
+            try:
+                with os.scandir(dir_path) as it:
+                    subdirs = sorted(
+                        (entry.name, entry) for entry in it
+                        if entry.is_dir(follow_symlinks=False))
+            except PermissionError:
+                continue
+            for name, entry in reversed(subdirs):
+                stack.append(
+                    (entry.path, entry, is_image_dir_name(name), is_image_dir))
 
-    def rename_images(self, images_dir):
+    def parse_image_name(self, filename):
         """
-        Renames the images in the images_dir directory in the format:
-            R{roll_number}F{frame_name}.jpg (or .tif)
+        Checks that an image's filename is in the expected format, and splits
+        out its frame number and frame name. The filename is made up of:
+            8 digits of roll number
+            4 digits of frame number
+            optionally, an underscore followed by the frame name
+
+        All the parts are at fixed positions, so the filename is just sliced
+        up instead of being matched against a regex, and all 12 digits are
+        checked at once with str methods, which loop over the characters in C.
+        The roll number is always filename[:8], and is left to the caller,
+        which groups the images by it.
+
+        filename is a str of the image's filename, without its extension.
+
+        Returns a (frame_number, frame_name) tuple of strs, where frame_name is
+        None if the filename doesn't have one, or None if the filename doesn't
+        match.
+        """
+        numbers = filename[:12]
+        if len(numbers) != 12 or not numbers.isascii() or \
+                not numbers.isdigit():
+            return None
+
+        if filename[12:13] == "_":
+            frame_name = filename[13:]
+        else:
+            frame_name = None
+        return filename[8:12], frame_name
 
-        images_dir is a path object that represents the directory of images to
-        operate on
+    def is_renamed_image_name(self, filename):
         """
-        roll_number = None
-        for image_path in sorted(images_dir.glob("*")):
-            filename = image_path.stem  # the filename without extension
-            prefix = image_path.parent  # the full path of the parent dir
-            suffix = image_path.suffix  # the extension including the .
-
-            if str(suffix).lower() not in (".jpg", ".tif") or \
-                    str(filename).startswith(".") or not image_path.is_file():
-                continue
+        Checks whether an image's filename looks like it was already renamed by
+        this script, as in R{roll_number}F{frame_name}.
 
-            match = self.image_name_matcher.match(filename)
-            if not match:
-                raise ValueError(
-                    f"image filename doesn't match expected format: "
-                    f"{image_path}")
+        filename is a str of the image's filename, without its extension.
 
-            if not roll_number:
-                roll_number = match.group("roll_number")
-            elif roll_number != match.group("roll_number"):
-                raise ValueError(
-                    f"image has different roll number than other files: "
-                    f"{image_path}")
+        Returns True if the filename is an R, then digits, then an F.
+        """
+        roll_end = filename.find("F", 1)
+        if roll_end < 2 or filename[0] != "R":
+            return False
+        roll_number = filename[1:roll_end]
+        return roll_number.isascii() and roll_number.isdigit()
 
-            # convert roll number to an int, and then zero pad it as desired
-            formatted_roll_number = \
-                f"{int(roll_number):0>{self.roll_padding}d}"
-            if self.use_frame_names:
-                frame_name = match.group("frame_name")
-                if not frame_name:
-                    raise ValueError(
-                        f"image filename doesn't contain the frame name:"
-                        f"{image_path}")
-            else:
-                frame_number = match.group("frame_number")
-                frame_name = f"{int(frame_number):0>2d}"
-            new_filename = f"R{formatted_roll_number}F{frame_name}"
-
-            new_filepath = prefix.joinpath(f"{new_filename}{suffix}")
-            print(f"{image_path.name} => {new_filename}{suffix}")
-            image_path.rename(new_filepath)
-
-    def fix_timestamps(self, images_dir):
+    def _process_dir(self, images_dir):
         """
-        Adds the DateTimeOriginal EXIF tag to all images, based on the
-        filesystem modified timestamp of the file. This fixes the issue where
-        rotating a file in Finder or Adobe Bridge will adjust the image's
+        Cleans up a single images_dir, using one listing of the directory for
+        everything, and works out the new timestamps and names of its images.
+
+        While listing the directory, the Info_HD.txt file that EZC generates if
+        you ask it to always save to HDD without confirming, and the *.thm
+        thumbnail files that EZC generates when outputting TIFFs, are deleted.
+
+        Next, the DateTimeOriginal EXIF tag is set for all images, based on
+        the filesystem modified timestamp of the file. This fixes the issue
+        where rotating a file in Finder or Adobe Bridge will adjust the image's
         modified timestamp, messing up programs that sort by Capture Time
         (such as Lightroom).
 
-        We set the capture times of the files as such:
+        We set the capture times of each roll's files as such:
             1st image gets the same capture time as its file modified time.
             2nd image gets the 1st image's capture time, but +1 millisecond.
             3rd image gets the 1st image's capture time, but +2 milliseconds.
@@ -187,65 +346,236 @@ class NoritsuEZCCleaner:
         frames get out of order, because LR would have to use filename to sort
         since they'd all have the same capture time.
 
-        images_dir is a path object that represents the directory of images to
-        operate on.
-        """
-        first_image_mtime = None
-        image_num = 0
-        for image_path in sorted(images_dir.glob("*")):
-            filename = image_path.stem  # the filename without extension
-            suffix = image_path.suffix  # the extension including the .
-
-            if str(suffix).lower() not in (".jpg", ".tif") or \
-                    str(filename).startswith(".") or not image_path.is_file():
-                continue
+        Then each image is given a new name in the format:
+            R{roll_number}F{frame_name}.jpg (or .tif)
+
+        The images aren't modified here, so they can be written to in batches
+        that span several directories. Instead, a list of
+        (entry, new_path, exiftool_args) tuples is returned, one per image,
+        to be passed to write_and_rename.
 
-            match = self.image_name_matcher.match(filename)
-            if not match:
+        images_dir is a str of the path of the directory of images to operate
+        on.
+        """
+        # these are looked up for every file, so bind them to locals once
+        verbose = self.verbose
+        use_frame_names = self.use_frame_names
+        image_suffixes = self.IMAGE_SUFFIXES
+        thumbnail_suffixes = self.THUMBNAIL_SUFFIXES
+        is_renamed_image_name = self.is_renamed_image_name
+
+        output = []
+        entries = []
+        renamed_image_path = None
+        with os.scandir(images_dir) as it:
+            for entry in it:
+                name = entry.name
+                if name.endswith(image_suffixes):
+                    # images that were already renamed by an earlier run are
+                    # left alone, so running again is cheap and safe
+                    if is_renamed_image_name(name[:-4]):
+                        renamed_image_path = entry.path
+                        continue
+                    if not name.startswith(".") and \
+                            entry.is_file(follow_symlinks=False):
+                        entries.append(entry)
+                elif name.endswith(thumbnail_suffixes) or \
+                        name == "Info_HD.txt":
+                    if entry.is_file(follow_symlinks=False):
+                        if verbose:
+                            output.append(f"deleting {entry.path}\n")
+                        os.unlink(entry.path)
+        self.write_output(output)
+        # a dir with both renamed and not yet renamed images can't be finished
+        # safely: the new names could replace the renamed images, and the new
+        # images' capture times would start over from the renamed ones'
+        if renamed_image_path and entries:
+            raise ValueError(
+                f"directory has both renamed and not yet renamed images: "
+                f"{renamed_image_path}")
+
+        # only the images are sorted, the other files never make it this far
+        entries.sort(key=attrgetter("name"))
+
+        # images are grouped by their roll number (the first 8 characters), so
+        # a dir holding more than one roll gets each roll numbered on its own.
+        # The entries are sorted, so each roll's images stay in order, and the
+        # rolls come out in order too.
+        rolls = {}
+        parse_image_name = self.parse_image_name
+        for entry in entries:
+            # all the IMAGE_SUFFIXES are 4 characters long
+            filename, suffix = entry.name[:-4], entry.name[-4:]
+
+            parsed_name = parse_image_name(filename)
+            if not parsed_name:
                 raise ValueError(
                     f"image filename doesn't match expected format: "
-                    f"{image_path}")
-
-            # only bump counter for jpgs and tiffs
-            image_num += 1
+                    f"{entry.path}")
+            frame_number, frame_name = parsed_name
 
-            if not first_image_mtime:
-                first_image_mtime = datetime.fromtimestamp(
-                    image_path.stat().st_mtime)
-
-            # image ordering is preserved in the capture time saved,
-            # see above docstring
+            if use_frame_names and not frame_name:
+                raise ValueError(
+                    f"image filename doesn't contain the frame name:"
+                    f"{entry.path}")
+
+            rolls.setdefault(filename[:8], []).append(
+                (entry, suffix, frame_number, frame_name))
+
+        images_dir_prefix = images_dir + os.sep
+        output = []
+        results = []
+        for roll_number, images in rolls.items():
+            # image ordering is preserved in the capture time saved, see above
+            # docstring. Every image in the roll uses the roll's first image's
+            # modified time, so it only has to be looked up and formatted once.
+            first_image_mtime = datetime.fromtimestamp(
+                images[0][0].stat().st_mtime)
             datetime_original = first_image_mtime.strftime(
                 self.EXIF_DATETIME_STR_FORMAT)
-            datetime_digitized = first_image_mtime.strftime(
-                self.EXIF_DATETIME_STR_FORMAT)
-            # There's 3 decimal places for the milliseconds, so zero-pad to 3
-            subsec_time_original = f"{image_num - 1:0>3d}"
-            subsec_time_digitized = f"{image_num - 1:0>3d}"
+            # the datetime arguments are the same for every image, only the
+            # SubSecTime arguments need to be built per image
+            datetime_args = [
+                f"-EXIF:DateTimeOriginal={datetime_original}",
+                f"-EXIF:DateTimeDigitized={datetime_original}",
+            ]
+
+            # strip the roll number's zero padding, and then zero pad it as
+            # desired. This is the same as going through int(), without the
+            # conversion.
+            formatted_roll_number = \
+                roll_number.lstrip("0").zfill(self.roll_padding) or "0"
+            # every new path in the roll starts the same way, so build that
+            # part once and just add the frame and suffix per image. There's no
+            # need for os.path.join per image.
+            new_path_prefix = \
+                images_dir_prefix + "R" + formatted_roll_number + "F"
+            for image_num, (entry, suffix, frame_number, frame_name) in \
+                    enumerate(images):
+                # There's 3 decimal places for the milliseconds, so zero-pad
+                # to 3
+                subsec_time = f"{image_num:0>3d}"
+
+                if verbose:
+                    output.append(f"{entry.name} getting datetime: "
+                                  f"{datetime_original}:"
+                                  f"{subsec_time}\n")
+
+                exiftool_args = datetime_args + [
+                    "-EXIF:SubSecTimeOriginal=" + subsec_time,
+                    "-EXIF:SubSecTimeDigitized=" + subsec_time,
+                    entry.path,
+                ]
+
+                if not use_frame_names:
+                    frame_name = frame_number.lstrip("0").zfill(2)
+                new_path = new_path_prefix + frame_name + suffix
+                results.append((entry, new_path, exiftool_args))
+        self.write_output(output)
+
+        return results
+
+    def write_and_rename(self, batch, rename_executor):
+        """
+        Writes the EXIF tags of all the images in several directories, with one
+        call to exiftool per EXIFTOOL_BATCH_SIZE images, and then submits each
+        directory's images to be renamed by rename_executor.
 
-            tags_to_write = {
-                "EXIF:DateTimeOriginal": datetime_original,
-                "EXIF:DateTimeDigitized": datetime_digitized,
-                "EXIF:SubSecTimeOriginal": subsec_time_original,
-                "EXIF:SubSecTimeDigitized": subsec_time_digitized,
-            }
+        batch is a list with one item per directory, of the images returned by
+        clean_dir for that directory.
+        rename_executor is the concurrent.futures.Executor to rename the images
+        on.
 
-            print(f"{image_path.name} getting datetime: "
-                  f"{datetime_original}:"
-                  f"{subsec_time_original}")
+        Returns a list of the Futures of the renames.
+        """
+        images = [(entry.path, exiftool_args)
+                  for dir_images in batch
+                  for entry, _, exiftool_args in dir_images]
+        # a single dir can have more than EXIFTOOL_BATCH_SIZE images, so the
+        # batch is split up by image rather than by dir
+        batch_size = self.EXIFTOOL_BATCH_SIZE
+        for start in range(0, len(images), batch_size):
+            self.write_tags(images[start:start + batch_size])
+
+        return [rename_executor.submit(self.rename_images, dir_images)
+                for dir_images in batch]
+
+    def rename_images(self, images):
+        """
+        Renames the given images to their new paths, in order. Renaming is
+        mostly waiting on the filesystem (especially network shares), so
+        several directories can be renamed at once on different threads.
 
-            try:
-                result = self.exiftool.set_tags(str(image_path), tags_to_write)
-            except exiftool.exceptions.ExifToolExecuteError as err:
-                print(f"exiftool error while updating timestamps on image: "
-                      f"{image_path}")
-                print(f"error: {err.stdout}")
-            else:
-                result = result.strip()
-                if result != self.EXIFTOOL_SUCCESSFUL_WRITE_MESSAGE:
-                    print(f"failed to update timestamps on image: "
-                          f"{image_path}")
-                    print(f"exiftool: {result}")
+        All the images must be from the same directory.
+
+        images is a list of (entry, new_path, exiftool_args) tuples as returned
+        by clean_dir.
+        """
+        if self.verbose:
+            self.write_output([
+                f"{entry.name} => {os.path.basename(new_path)}\n"
+                for entry, new_path, _ in images])
+
+        if os.rename not in os.supports_dir_fd:
+            for entry, new_path, _ in images:
+                os.rename(entry.path, new_path)
+            return
+
+        # rename relative to the images' directory (renameat), so each rename
+        # only looks up the filenames instead of walking the full path twice
+        dir_fd = os.open(os.path.dirname(images[0][0].path),
+                         os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        try:
+            for entry, new_path, _ in images:
+                os.rename(entry.name, os.path.basename(new_path),
+                          src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def write_output(self, lines):
+        """
+        Prints many lines of output with a single write. This is a lot cheaper
+        than a print per line, especially on a console, and keeps the output of
+        different threads from getting mixed together line by line.
+
+        lines is a list of strs, each ending with a newline.
+        """
+        if lines:
+            sys.stdout.write("".join(lines))
+
+    def write_tags(self, images):
+        """
+        Writes EXIF tags to many images with a single call to exiftool.
+
+        Each image gets its own exiftool command, and all of them are sent in
+        one batch separated by "-execute". exiftool prints "{ready}" after
+        every command but the last, which is used to split its output back up
+        per image.
+
+        images is a list of (image_path, exiftool_args) tuples, where
+        exiftool_args is a list of str arguments to pass to exiftool for the
+        image at the str image_path.
+        """
+        batch_args = []
+        for _, exiftool_args in images:
+            if batch_args:
+                batch_args.append("-execute")
+            batch_args += exiftool_args
+
+        try:
+            output = self.exiftool.execute(*batch_args)
+        except exiftool.exceptions.ExifToolExecuteError as err:
+            # the exit status is only for the last command, so still check
+            # the result of every image below
+            output = err.stdout
+
+        results = output.split("{ready}")
+        for (image_path, _), result in zip(images, results):
+            result = result.strip()
+            if result != self.EXIFTOOL_SUCCESSFUL_WRITE_MESSAGE:
+                self.write_output([
+                    f"failed to update timestamps on image: {image_path}\n",
+                    f"exiftool: {result}\n"])
 
 
 if __name__ == "__main__":
@@ -270,6 +600,21 @@ if __name__ == "__main__":
         "numbers/names in the final filename or just number them "
         "sequentially. default: False"
     )
+    parser.add_argument(
+        "--jobs", type=positive_int, default=None,
+        help="how many roll directories to process at the same time. "
+        "default: the number of CPUs"
+    )
+    parser.add_argument(
+        "--quiet", action="store_true",
+        help="only print warnings and errors, instead of every file that gets "
+        "deleted, timestamped or renamed. default: False"
+    )
+    parser.add_argument(
+        "--rename_workers", type=positive_int, default=1,
+        help="how many roll directories to rename the images of at the same "
+        "time. Can speed up network shares, but not local disks. default: 1"
+    )
 
     args = parser.parse_args()
 
@@ -281,5 +626,8 @@ if __name__ == "__main__":
             exiftool_client=et,
             search_path=args.search_path,
             roll_padding=args.roll_padding,
-            use_frame_names=args.use_frame_names)
+            use_frame_names=args.use_frame_names,
+            jobs=args.jobs,
+            rename_workers=args.rename_workers,
+            verbose=not args.quiet)
         cleaner.clean()